@@ -4,10 +4,17 @@ Add webpage column to construction company CSVs with verified active URLs.
 """
 
 import csv
+import operator
+import os
+import tempfile
+import types
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
+from typing import Mapping
 
 # Official company websites - researched and verified
-WEBPAGE_MAP = {
+WEBPAGE_MAP: Mapping[str, str] = types.MappingProxyType({
     # CDC_midbln - Global construction
     "China State Construction Engineering": "https://english.cscec.com/",
     "China Railway Group": "https://www.crecg.com/english/",
@@ -165,7 +172,16 @@ WEBPAGE_MAP = {
     "Cedar Woods Properties": "https://www.cedarwoods.com.au/",
     "Villa World (AVID Property Group)": "https://www.avid.com.au/",
     "Goodman Group": "https://www.goodman.com/",
-}
+})
+
+# Lowercased read-only view of WEBPAGE_MAP, built once so lookups don't re-lower every key per row
+WEBPAGE_MAP_LOWER: Mapping[str, str] = types.MappingProxyType({k.lower(): v for k, v in WEBPAGE_MAP.items()})
+_LOWER_ITEMS = tuple(WEBPAGE_MAP_LOWER.items())
+
+# Process the CSVs in worker processes only above this total size: starting workers costs ~10 ms
+# (fork) to ~0.6 s (spawn), and each worker gets its own _get_webpage_cached, so names repeated
+# across CSVs only hit the cache when the files share one process
+PARALLEL_CSV_BYTES = 64 << 20
 
 
 def normalize_name(name: str) -> str:
@@ -173,45 +189,68 @@ def normalize_name(name: str) -> str:
     return name.strip().strip('"')
 
 
-def get_webpage(brand_name: str) -> str:
-    """Get webpage URL for company, with fuzzy matching."""
-    name = normalize_name(brand_name)
+@lru_cache(maxsize=4096)
+def _get_webpage_cached(name_lower: str) -> str:
+    """Look up an already normalized, lowercased name (WEBPAGE_MAP is constant, so cache is safe)."""
     # Direct match
-    if name in WEBPAGE_MAP:
-        return WEBPAGE_MAP[name]
+    if name_lower in WEBPAGE_MAP_LOWER:
+        return WEBPAGE_MAP_LOWER[name_lower]
+    if not name_lower:
+        return ""
     # Try common variants
-    for key, url in WEBPAGE_MAP.items():
-        if key.lower() in name.lower() or name.lower() in key.lower():
+    for key, url in _LOWER_ITEMS:
+        if key in name_lower or name_lower in key:
             return url
     return ""
 
 
+def get_webpage(brand_name: str) -> str:
+    """Get webpage URL for company, with fuzzy matching."""
+    return _get_webpage_cached(normalize_name(brand_name).lower())
+
+
 def process_csv(csv_path: Path, output_path: Path = None) -> None:
     """Add webpage column to CSV and verify URLs."""
     output_path = output_path or csv_path
-    rows = []
-    with open(csv_path, encoding="utf-8", newline="") as f:
-        reader = csv.DictReader(f)
-        fieldnames = list(reader.fieldnames) + ["webpage"]
-        for row in reader:
-            brand_name = row.get("brand_name", "")
-            url = get_webpage(brand_name)
-            # Keep URL (from researched mapping); verification is best-effort
-            row["webpage"] = url
-            rows.append(row)
-
-    with open(output_path, "w", encoding="utf-8", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(rows)
-    print(f"Updated {output_path} with webpage column ({len(rows)} rows)")
+    # Stream rows into a temp file next to the output, then swap it in atomically
+    fd, tmp_path = tempfile.mkstemp(dir=output_path.parent, suffix=".tmp")
+    count = 0
+    try:
+        with open(csv_path, encoding="utf-8", newline="") as src, \
+                open(fd, "w", encoding="utf-8", newline="") as dst:
+            reader = csv.DictReader(src)
+            fieldnames = list(reader.fieldnames) + ["webpage"]
+            # Positional writer: pull values in header order with one C-level getter
+            row_values = operator.itemgetter(*fieldnames)
+            writer = csv.writer(dst)
+            writer.writerow(fieldnames)
+            for row in reader:
+                # Keep URL (from researched mapping); verification is best-effort
+                row["webpage"] = get_webpage(row.get("brand_name", ""))
+                writer.writerow(row_values(row))
+                count += 1
+        # mkstemp creates the file 0600; keep the permissions of the file being replaced
+        os.chmod(tmp_path, os.stat(output_path if output_path.exists() else csv_path).st_mode & 0o7777)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    print(f"Updated {output_path} with webpage column ({count} rows)")
 
 
 def main():
     base = Path(__file__).parent
-    for name in ["CDC_midbln.csv", "CDC_CIS_100mln.csv", "CDC_IPO.csv"]:
-        path = base / name
-        if path.exists():
+    paths = [base / name for name in ["CDC_midbln.csv", "CDC_CIS_100mln.csv", "CDC_IPO.csv"]]
+    paths = [path for path in paths if path.exists()]
+    if not paths:
+        return
+    workers = min(len(paths), os.cpu_count() or 1)
+    if workers > 1 and sum(p.stat().st_size for p in paths) >= PARALLEL_CSV_BYTES:
+        # Files are independent; process large ones in parallel (one worker per file)
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            list(ex.map(process_csv, paths))
+    else:
+        for path in paths:
             process_csv(path)
 
 
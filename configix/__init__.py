@@ -1,13 +1,11 @@
 # Configix package initialization
+from . import apiManager
 from .apiManager import (
     switch_ai_provider,
     get_current_ai,
     get_ai_provider,
     get_mapbox_config,
-    get_available_ai_providers,
-    ai_gemini,
-    ai_grok,
-    ai_openai
+    get_available_ai_providers
 )
 
 __all__ = [
@@ -20,3 +18,9 @@ __all__ = [
     'ai_grok',
     'ai_openai'
 ]
+
+# Provider configs (ai_gemini, ai_grok, ai_openai) load on first access
+def __getattr__(name):
+    if name in ('ai_gemini', 'ai_grok', 'ai_openai'):
+        return getattr(apiManager, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
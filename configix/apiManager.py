@@ -1,7 +1,7 @@
 # API Manager - Switch between AI providers and access Mapbox config
 import os
 import json
-import re
+from functools import lru_cache
 from pathlib import Path
 
 # Load configurations
@@ -18,50 +18,67 @@ if not config_dir.exists():
 if not config_dir.exists():
     raise FileNotFoundError(f"Config directory not found. Tried: {config_dir}")
 
-try:
-    with open(config_dir / 'config_gemini.json', 'r', encoding='utf-8') as f:
-        gemini_config = json.load(f)
-    with open(config_dir / 'config_grok.json', 'r', encoding='utf-8') as f:
-        grok_config = json.load(f)
-    with open(config_dir / 'config_openai.json', 'r', encoding='utf-8') as f:
-        openai_config = json.load(f)
-except Exception as e:
-    raise Exception(f"Error loading config files from {config_dir}: {str(e)}")
+# Provider id -> (display name, config file, api key field)
+_PROVIDERS = {
+    'ai_gemini': ('Gemini', 'config_gemini.json', 'ITEM'),
+    'ai_grok': ('Grok', 'config_grok.json', 'grok_api_key'),
+    'ai_openai': ('OpenAI', 'config_openai.json', 'openai_api_key'),
+}
 
-# Mapbox config
-mapbox_config = None
-try:
-    with open(config_dir / 'mapboxConfig.js', 'r', encoding='utf-8') as f:
-        mapbox_config_content = f.read()
-    
-    mapbox_token_match = re.search(r"MAPBOX_ACCESS_TOKEN\s*=\s*['\"]([^'\"]+)['\"]", mapbox_config_content)
-    mapbox_style_match = re.search(r"MAPBOX_STYLE\s*=\s*['\"]([^'\"]+)['\"]", mapbox_config_content)
-    
-    mapbox_config = {
-        'MAPBOX_ACCESS_TOKEN': mapbox_token_match.group(1) if mapbox_token_match else None,
-        'MAPBOX_STYLE': mapbox_style_match.group(1) if mapbox_style_match else None
-    }
-except Exception as e:
-    print(f'Error loading Mapbox config: {e}')
+# Config files are only read and parsed on first use, then cached
+@lru_cache(maxsize=None)
+def _cfg(name):
+    try:
+        return json.loads((config_dir / name).read_text(encoding='utf-8'))
+    except Exception as e:
+        raise Exception(f"Error loading config files from {config_dir}: {str(e)}")
 
-# AI Provider configurations
-ai_providers = {
-    'ai_gemini': {
-        'name': 'Gemini',
-        'api_key': gemini_config.get('ITEM'),
-        'config': gemini_config
-    },
-    'ai_grok': {
-        'name': 'Grok',
-        'api_key': grok_config.get('grok_api_key'),
-        'config': grok_config
-    },
-    'ai_openai': {
-        'name': 'OpenAI',
-        'api_key': openai_config.get('openai_api_key'),
-        'config': openai_config
+@lru_cache(maxsize=None)
+def _provider(provider):
+    name, filename, key_field = _PROVIDERS[provider]
+    config = _cfg(filename)
+    return {
+        'name': name,
+        'api_key': config.get(key_field),
+        'config': config
     }
-}
+
+# Mapbox config
+def _js_string_const(line, name):
+    """Return the quoted value of `name = '...'` in a JS source line, or None."""
+    _, found, rest = line.partition(name)
+    rest = rest.lstrip()
+    if not found or not rest.startswith('='):
+        return None
+    rest = rest[1:].lstrip()
+    if not rest or rest[0] not in '\'"':
+        return None
+    value, closed, _ = rest[1:].partition(rest[0])
+    if not closed or not value or '"' in value or "'" in value:
+        return None
+    return value
+
+@lru_cache(maxsize=1)
+def _load_mapbox():
+    try:
+        token = style = None
+        # Scan line by line and stop as soon as both constants are found
+        with open(config_dir / 'mapboxConfig.js', 'r', encoding='utf-8') as f:
+            for line in f:
+                if token is None and 'MAPBOX_ACCESS_TOKEN' in line:
+                    token = _js_string_const(line, 'MAPBOX_ACCESS_TOKEN')
+                if style is None and 'MAPBOX_STYLE' in line:
+                    style = _js_string_const(line, 'MAPBOX_STYLE')
+                if token and style:
+                    break
+        
+        return {
+            'MAPBOX_ACCESS_TOKEN': token,
+            'MAPBOX_STYLE': style
+        }
+    except Exception as e:
+        print(f'Error loading Mapbox config: {e}')
+        return None
 
 # Current AI provider (default: OpenAI)
 current_ai_provider = 'ai_openai'
@@ -69,30 +86,46 @@ current_ai_provider = 'ai_openai'
 def switch_ai_provider(provider):
     """Switch AI provider"""
     global current_ai_provider
-    if provider in ai_providers:
-        current_ai_provider = provider
-        return True
-    raise ValueError(f"Invalid AI provider: {provider}. Available: {', '.join(ai_providers.keys())}")
+    try:
+        _PROVIDERS[provider]
+    except KeyError:
+        raise ValueError(f"Invalid AI provider: {provider}. Available: {', '.join(_PROVIDERS)}") from None
+    current_ai_provider = provider
+    return True
 
 def get_current_ai():
     """Get current AI provider config"""
-    return ai_providers[current_ai_provider]
+    return _provider(current_ai_provider)
 
 def get_ai_provider(provider):
     """Get specific AI provider config"""
-    if provider in ai_providers:
-        return ai_providers[provider]
-    raise ValueError(f"Invalid AI provider: {provider}. Available: {', '.join(ai_providers.keys())}")
+    try:
+        return _provider(provider)
+    except KeyError:
+        raise ValueError(f"Invalid AI provider: {provider}. Available: {', '.join(_PROVIDERS)}") from None
 
 def get_mapbox_config():
     """Get Mapbox configuration"""
-    return mapbox_config
+    return _load_mapbox()
 
 def get_available_ai_providers():
     """Get all available AI providers"""
-    return list(ai_providers.keys())
+    return list(_PROVIDERS.keys())
+
+# Export for direct access; configs are loaded lazily on first attribute access
+_CONFIG_FILES = {
+    'gemini_config': 'config_gemini.json',
+    'grok_config': 'config_grok.json',
+    'openai_config': 'config_openai.json',
+}
 
-# Export for direct access
-ai_gemini = ai_providers['ai_gemini']
-ai_grok = ai_providers['ai_grok']
-ai_openai = ai_providers['ai_openai']
+def __getattr__(name):
+    if name in _PROVIDERS:
+        return _provider(name)
+    if name == 'ai_providers':
+        return {provider: _provider(provider) for provider in _PROVIDERS}
+    if name in _CONFIG_FILES:
+        return _cfg(_CONFIG_FILES[name])
+    if name == 'mapbox_config':
+        return _load_mapbox()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -7,15 +7,37 @@ Output: CDC_IPO.csv with schema; progress logged as JSONL.
 import sys
 import json
 import csv
+import hashlib
+import itertools
+import operator
 import re
+import sqlite3
 import time
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set, TextIO, Tuple
 
 # Ensure configix is importable
 sys.path.insert(0, str(Path(__file__).parent))
 from configix.apiManager import ai_gemini
 
+# orjson parses large model responses faster; stdlib json is the fallback
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_loads(text: str) -> Any:
+    """orjson.loads, falling back to json.loads for what orjson rejects (NaN/Infinity literals)."""
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(text)
+
 # Try google-genai first (new SDK), fallback to google-generativeai
 GEMINI_CLIENT = None
 USE_LEGACY = False
@@ -33,10 +55,23 @@ except ImportError:
         print("  Or fallback: pip install google-generativeai")
         sys.exit(1)
 
+# Build the Gemini client once so its HTTP connection pool is reused across calls
+_API_KEY = ai_gemini.get("api_key")
+if not _API_KEY:
+    print("Error: Gemini API key not found in config. Check config/config_gemini.json")
+    sys.exit(1)
+if USE_LEGACY:
+    GEMINI_CLIENT.configure(api_key=_API_KEY)
+    _CLIENT = GEMINI_CLIENT.GenerativeModel("gemini-1.5-flash")
+else:
+    _CLIENT = GEMINI_CLIENT.Client(api_key=_API_KEY)
+
 # Output paths
 OUTPUT_DIR = Path(__file__).parent
 CSV_PATH = OUTPUT_DIR / "CDC_IPO.csv"
 PROGRESS_PATH = OUTPUT_DIR / "CDC_IPO_progress.jsonl"
+# Gemini responses keyed by prompt hash, so re-runs skip the network
+CACHE_PATH = OUTPUT_DIR / ".gemini_cache.sqlite"
 
 # CSV schema
 SCHEMA = [
@@ -44,69 +79,107 @@ SCHEMA = [
     "lat", "lon", "country", "country_code", "founded",
     "last_Y", "last_Ninc", "Y", "IPO", "employees"
 ]
+_FIELDS = tuple(SCHEMA[1:])
+_ROW_VALUES = operator.itemgetter(*SCHEMA)
+
+# JSON array in a markdown code block, or anywhere in the response
+_FENCE_RE = re.compile(r"```(?:json)?\s*(\[.*?\])\s*```", re.DOTALL)
+_ARRAY_RE = re.compile(r"(\[.*\])", re.DOTALL)
 
 
-def log_progress(evt: str, data: Dict[str, Any]) -> None:
-    """Append progress event as JSONL; also print."""
+def log_progress(pf: TextIO, evt: str, data: Dict[str, Any]) -> None:
+    """Append progress event as JSONL to the open progress file; also print."""
     entry = {"evt": evt, "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), **data}
-    line = json.dumps(entry, ensure_ascii=False) + "\n"
-    with open(PROGRESS_PATH, "a", encoding="utf-8") as f:
-        f.write(line)
-    print(json.dumps(entry, ensure_ascii=False))
+    line = json.dumps(entry, ensure_ascii=False)
+    pf.write(line + "\n")
+    print(line)
 
 
 def _extract_text(response) -> str:
     """Extract text from Gemini API response (supports multiple SDK versions)."""
-    if hasattr(response, "text") and response.text:
-        return response.text
-    if hasattr(response, "candidates") and response.candidates:
-        parts = response.candidates[0].content.parts
+    try:
+        text = response.text
+    except (AttributeError, ValueError):
+        # Legacy SDK raises ValueError from .text when the candidate has no parts
+        text = None
+    return text if text else _extract_candidate_text(response)
+
+
+def _extract_candidate_text(response) -> str:
+    """Fallback: first part of the first candidate, else the response repr."""
+    candidates = getattr(response, "candidates", None)
+    if candidates:
+        parts = candidates[0].content.parts
         if parts:
             return getattr(parts[0], "text", str(parts[0]))
     return str(response)
 
 
-def call_gemini(prompt: str, model: str = "gemini-2.0-flash") -> str:
-    """Call Gemini API via configix apiManager."""
-    api_key = ai_gemini.get("api_key")
-    if not api_key:
-        raise ValueError("Gemini API key not found in config. Check config/config_gemini.json")
+def _cache_db() -> sqlite3.Connection:
+    db = sqlite3.connect(CACHE_PATH, timeout=30)
+    db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, text TEXT NOT NULL)")
+    return db
+
+
+def _cache_get(key: str) -> Optional[str]:
+    with closing(_cache_db()) as db:
+        row = db.execute("SELECT text FROM responses WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def _cache_put(key: str, text: str) -> None:
+    with closing(_cache_db()) as db, db:
+        db.execute("INSERT OR REPLACE INTO responses (key, text) VALUES (?, ?)", (key, text))
+
+
+def call_gemini(prompt: str, model: str = "gemini-2.0-flash", use_cache: bool = True) -> Tuple[str, List[Dict]]:
+    """Call Gemini API via the shared client (key from configix apiManager).
+
+    Returns (response text, extract_json_array of it), so each reply is parsed once.
+    Responses are cached on disk by prompt hash; use_cache=False skips the lookup
+    but still stores the fresh response. Only responses that parse to a non-empty
+    company list are cached (or served from cache), so bad replies are retried.
+    """
+    key = hashlib.blake2b(f"{model}\n{prompt}".encode("utf-8"), digest_size=16).hexdigest()
+    if use_cache and (cached := _cache_get(key)) is not None and (companies := extract_json_array(cached)):
+        return cached, companies
     if USE_LEGACY:
-        GEMINI_CLIENT.configure(api_key=api_key)
-        model_obj = GEMINI_CLIENT.GenerativeModel("gemini-1.5-flash")
-        response = model_obj.generate_content(prompt)
-        return _extract_text(response)
+        response = _CLIENT.generate_content(prompt)
     else:
-        client = GEMINI_CLIENT.Client(api_key=api_key)
-        response = client.models.generate_content(model=model, contents=prompt)
-        return _extract_text(response)
+        response = _CLIENT.models.generate_content(model=model, contents=prompt)
+    text = _extract_text(response)
+    companies = extract_json_array(text)
+    if companies:
+        _cache_put(key, text)
+    return text, companies
 
 
 def extract_json_array(text: str) -> List[Dict]:
     """Extract JSON array from model response."""
     out = []
-    # Try markdown code block first
-    m = re.search(r"```(?:json)?\s*(\[[\s\S]*?\])\s*```", text)
+    # Well-behaved responses are pure JSON; try that before any regex scan
+    try:
+        parsed = _json_loads(text)
+        if isinstance(parsed, list):
+            return parsed
+        if isinstance(parsed, dict) and "companies" in parsed:
+            return parsed["companies"]
+    except json.JSONDecodeError:
+        pass
+    # Try markdown code block
+    m = _FENCE_RE.search(text)
     if m:
         try:
-            return json.loads(m.group(1))
+            return _json_loads(m.group(1))
         except json.JSONDecodeError:
             pass
     # Try raw array
-    m = re.search(r"(\[[\s\S]*\])", text)
+    m = _ARRAY_RE.search(text)
     if m:
         try:
-            return json.loads(m.group(1))
+            return _json_loads(m.group(1))
         except json.JSONDecodeError:
             pass
-    try:
-        parsed = json.loads(text)
-        if isinstance(parsed, list):
-            return parsed
-        if isinstance(parsed, dict) and "companies" in parsed:
-            return parsed["companies"]
-    except json.JSONDecodeError:
-        pass
     return out
 
 
@@ -138,34 +211,32 @@ Return ONLY a valid JSON array, no other text."""
 
 def normalize_row(row: Dict, brand_id: int) -> Dict[str, Any]:
     """Map raw API fields to CSV schema."""
-    def _n(v):
-        if v is None or v == "" or (isinstance(v, str) and v.strip() == ""):
-            return ""
-        if isinstance(v, (int, float)) and str(v) == "nan":
-            return ""
-        return v
-    return {
-        "brand_id": brand_id,
-        "brand_name": _n(row.get("brand_name")),
-        "hq_office": _n(row.get("hq_office")),
-        "hq_address": _n(row.get("hq_address")),
-        "lat": _n(row.get("lat")),
-        "lon": _n(row.get("lon")),
-        "country": _n(row.get("country")),
-        "country_code": _n(row.get("country_code")),
-        "founded": _n(row.get("founded")),
-        "last_Y": _n(row.get("last_Y")),
-        "last_Ninc": _n(row.get("last_Ninc")),
-        "Y": _n(row.get("Y")),
-        "IPO": _n(row.get("IPO")),
-        "employees": _n(row.get("employees")),
-    }
+    # None, blank strings and NaN (v != v; stdlib json accepts NaN) become empty cells
+    return {"brand_id": brand_id, **{
+        k: "" if (v := row.get(k)) is None or (isinstance(v, str) and not v.strip()) or v != v else v
+        for k in _FIELDS
+    }}
 
 
 def main():
-    log_progress("start", {"output_csv": str(CSV_PATH), "progress_file": str(PROGRESS_PATH)})
-    seen = set()
-    rows: List[Dict] = []
+    import argparse
+    p = argparse.ArgumentParser(description="Find IPO construction development companies via Gemini")
+    p.add_argument("--no-cache", action="store_true", help="Ignore cached Gemini responses (fresh ones are still stored)")
+    args = p.parse_args()
+    # Keep the progress log open for the whole run instead of reopening it per event;
+    # rows are appended to the CSV as they are found so a partial run keeps its results
+    with open(PROGRESS_PATH, "a", encoding="utf-8", buffering=1 << 16) as pf, \
+            open(CSV_PATH, "w", newline="", encoding="utf-8") as cf:
+        _run(pf, cf, use_cache=not args.no_cache)
+
+
+def _run(pf: TextIO, cf: TextIO, use_cache: bool = True) -> None:
+    log_progress(pf, "start", {"output_csv": str(CSV_PATH), "progress_file": str(PROGRESS_PATH)})
+    w = csv.writer(cf)
+    w.writerow(SCHEMA)
+    seen: Set[int] = set()
+    brand_ids = itertools.count(1)
+    total = 0
     regions = [
         "North America (USA, Canada)",
         "Europe (Western, Central, Eastern)",
@@ -174,36 +245,39 @@ def main():
         "Middle East and Africa",
         "Australia and Oceania",
     ]
-    for i, region in enumerate(regions):
-        log_progress("region_start", {"region": region, "index": i + 1, "total": len(regions)})
-        try:
-            prompt = prompt_companies(region)
-            resp = call_gemini(prompt)
-            log_progress("api_response", {"region": region, "length": len(resp)})
-            companies = extract_json_array(resp)
-            log_progress("parsed", {"region": region, "count": len(companies)})
-            for c in companies:
-                if not isinstance(c, dict):
-                    continue
-                name = (c.get("brand_name") or c.get("hq_office") or "").strip()
-                if not name:
-                    continue
-                key = (name.lower(), c.get("country_code", ""))
-                if key in seen:
-                    continue
-                seen.add(key)
-                rows.append(normalize_row(c, len(rows) + 1))
-                log_progress("company_added", {"brand_name": name, "brand_id": len(rows)})
-        except Exception as e:
-            log_progress("error", {"region": region, "message": str(e)})
-            continue
-        time.sleep(2)
-    with open(CSV_PATH, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=SCHEMA)
-        w.writeheader()
-        w.writerows(rows)
-    log_progress("done", {"total": len(rows), "csv": str(CSV_PATH)})
-    print(f"\nWrote {len(rows)} companies to {CSV_PATH}")
+    # Region calls are network-bound: fan them out and handle responses as they arrive.
+    # Six concurrent requests stay well inside Gemini's per-minute limits.
+    with ThreadPoolExecutor(max_workers=len(regions)) as ex:
+        futs = {}
+        for i, region in enumerate(regions):
+            log_progress(pf, "region_start", {"region": region, "index": i + 1, "total": len(regions)})
+            futs[ex.submit(call_gemini, prompt_companies(region), use_cache=use_cache)] = region
+        for fut in as_completed(futs):
+            region = futs[fut]
+            try:
+                resp, companies = fut.result()
+                log_progress(pf, "api_response", {"region": region, "length": len(resp)})
+                log_progress(pf, "parsed", {"region": region, "count": len(companies)})
+                for c in companies:
+                    if not isinstance(c, dict):
+                        continue
+                    name = (c.get("brand_name") or c.get("hq_office") or "").strip()
+                    if not name:
+                        continue
+                    # Dedup on the hash of (lowercased name, country); collisions are negligible at this size
+                    key = hash((name.lower(), c.get("country_code") or ""))
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    brand_id = next(brand_ids)
+                    w.writerow(_ROW_VALUES(normalize_row(c, brand_id)))
+                    total += 1
+                    log_progress(pf, "company_added", {"brand_name": name, "brand_id": brand_id})
+            except Exception as e:
+                log_progress(pf, "error", {"region": region, "message": str(e)})
+            cf.flush()
+    log_progress(pf, "done", {"total": total, "csv": str(CSV_PATH)})
+    print(f"\nWrote {total} companies to {CSV_PATH}")
 
 
 if __name__ == "__main__":
@@ -5,12 +5,23 @@ use AI (ai_openai / OpenAI first, ai_gemini fallback) to find the main company w
 Otherwise skip.
 """
 
+import asyncio
 import csv
 import json
+import os
 import re
 import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 
+from webpage_common import (
+    CONCURRENCY, cache_drop, cache_get, cache_key, cache_put, dump_json, gemini_generate, get_ai_keys,
+    load_json, make_ai_clients, openai_chat, parse_ai_url,
+)
+
+
 # Non-company URLs: stock quotes, investor relations, etc. (not main brand website)
 NON_BRAND_URL_PATTERNS = [
     r"yahoo\.com",
@@ -32,122 +43,231 @@ NON_BRAND_URL_PATTERNS = [
 ]
 NON_BRAND_REGEX = re.compile("|".join(NON_BRAND_URL_PATTERNS), re.I)
 
+# Same patterns, split for is_non_brand_page: plain substrings (C-level `in` on the lowercased
+# URL) plus one residual regex for the patterns that need word boundaries or character classes
+NON_BRAND_LITERALS = (
+    "yahoo.com", "finance.yahoo", "/quote/", "sec.gov", "nasdaq.com", "bloomberg.com",
+    "reuters.com", "edgar", "investorrelations", "/shareholder",
+)
+NON_BRAND_RESIDUAL_REGEX = re.compile(r"\b(?:finance|ir|investors?)\.|/(?:investors?|ir)[/\s]")
+
+# Companies per batched OpenAI request
+BATCH_SIZE = 25
+
+# Prompt version for the AI answer cache keys (see webpage_common.cache_key)
+CACHE_VERSION = "fix-v1"
+
+
+def _non_brand_match(url: str, start: int = 0) -> bool:
+    """Any non-brand pattern in the lowercased url at or after start (word boundaries still see url[:start])."""
+    tail = url[start:]
+    return any(p in tail for p in NON_BRAND_LITERALS) or bool(NON_BRAND_RESIDUAL_REGEX.search(url, start))
+
+
+@lru_cache(maxsize=8192)
+def _host_non_brand(head: str) -> bool:
+    """_non_brand_match for the "scheme://host/" part of a URL; many rows share few distinct hosts."""
+    return _non_brand_match(head)
+
 
 def is_non_brand_page(url: str) -> bool:
     """Return True if URL is not the main company site (e.g. Yahoo Finance, investor page)."""
     if not url or not isinstance(url, str):
         return False
-    return bool(NON_BRAND_REGEX.search(url))
-
-
-def _load_openai_key(config_dir: Path) -> str | None:
-    p = config_dir / "config_openai.json"
-    if not p.exists():
-        return None
-    with open(p, encoding="utf-8") as f:
-        return json.load(f).get("openai_api_key")
+    url = url.lower()
+    # Host part through the cache, the path after it scanned directly. Both include the "/"
+    # between them: no pattern has a "/" in its middle, so no match can straddle that slash.
+    split = url.find("/", url.find("//") + 2)
+    if split == -1:
+        return _host_non_brand(url)
+    return _host_non_brand(url[:split + 1]) or _non_brand_match(url, split)
 
 
-def _load_gemini_key(config_dir: Path) -> str | None:
-    p = config_dir / "config_gemini.json"
-    if not p.exists():
-        return None
-    with open(p, encoding="utf-8") as f:
-        return json.load(f).get("ITEM")
-
-
-def get_ai_keys() -> tuple[str | None, str | None]:
-    """Return (openai_key, gemini_key). Tries config dirs, then configix ai_openai/ai_gemini."""
-    openai_key = gemini_key = None
-    for base in [
-        Path(__file__).parent.parent / "config",
-        Path("C:/12_CODINGHARD/config"),
-        Path(__file__).parent / "config",
-    ]:
-        if base.exists():
-            openai_key = openai_key or _load_openai_key(base)
-            gemini_key = gemini_key or _load_gemini_key(base)
+async def ask_gemini_for_webpage(client, company_name: str, country: str) -> str | None:
+    """Use Gemini (ai_gemini) to suggest main company website."""
     try:
-        cfg = __import__("configix").apiManager
-        openai_key = openai_key or cfg.get_ai_provider("ai_openai")["api_key"]
-        gemini_key = gemini_key or cfg.get_ai_provider("ai_gemini")["api_key"]
-    except Exception:
-        pass
-    return openai_key, gemini_key
-
-
-def _parse_ai_url(text: str) -> str | None:
-    """Extract a valid https URL from AI response."""
-    text = (text or "").strip()
-    text = re.sub(r"^['\"]|['\"]$", "", text)
-    if text.upper() == "NONE" or not text.startswith("http"):
+        resp = await gemini_generate(
+            client,
+            model="gemini-2.0-flash",
+            contents=f"Main company website (not investor/IPO page) for: {company_name} (company based in {country}). Construction/real estate/development company. Reply with ONLY a single valid https URL. No explanation. If unknown, reply NONE.",
+        )
+        text = getattr(resp, "text", None) or (
+            resp.candidates[0].content.parts[0].text if resp.candidates and resp.candidates[0].content.parts else ""
+        )
+        return parse_ai_url(text)
+    except Exception as e:
+        print(f"  Gemini error ({company_name}): {e}")
         return None
-    return text
 
 
-def ask_openai_for_webpage(company_name: str, country: str, api_key: str) -> str | None:
-    """Use OpenAI (ai_openai) to suggest main company website (not investor page)."""
+async def ask_openai_batch(client, items: list[tuple[str, str]]) -> list[str | None]:
+    """Use OpenAI (ai_openai) to suggest main websites for many (name, country) companies in one
+    request. Returns URLs aligned with items; None where the model answered NONE or failed."""
+    payload = [{"id": i, "name": name, "country": country} for i, (name, country) in enumerate(items)]
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=api_key)
-        resp = client.chat.completions.create(
+        resp = await openai_chat(
+            client,
             model="gpt-4o-mini",
             messages=[
                 {
                     "role": "system",
-                    "content": "You are a researcher. Reply with ONLY a single valid URL (https://) of the official MAIN corporate website for the given company—NOT investor relations, NOT SEC filings. If unsure, return best guess. No explanation, no quotes, just the URL. If you cannot find one, reply exactly: NONE",
+                    "content": 'You are a researcher. For each company in the given JSON list, find the official MAIN corporate website (https://)—NOT investor relations, NOT SEC filings. If unsure, return best guess. Reply with ONLY a JSON object mapping each company "id" (as a string) to its URL, or to "NONE" if you cannot find one.',
                 },
                 {
                     "role": "user",
-                    "content": f"Main company website (not investor/IPO page) for: {company_name} (company based in {country}). Construction/real estate/development company.",
+                    "content": "Construction/real estate/development companies:\n" + json.dumps(payload, ensure_ascii=False),
                 },
             ],
+            response_format={"type": "json_object"},
             temperature=0.3,
-            max_tokens=256,
-        )
-        return _parse_ai_url(resp.choices[0].message.content)
-    except Exception as e:
-        print(f"  OpenAI error: {e}")
-        return None
-
-
-def ask_gemini_for_webpage(company_name: str, country: str, api_key: str) -> str | None:
-    """Use Gemini (ai_gemini) to suggest main company website."""
-    try:
-        from google import genai
-        client = genai.Client(api_key=api_key)
-        resp = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=f"Main company website (not investor/IPO page) for: {company_name} (company based in {country}). Construction/real estate/development company. Reply with ONLY a single valid https URL. No explanation. If unknown, reply NONE.",
-        )
-        text = getattr(resp, "text", None) or (
-            resp.candidates[0].content.parts[0].text if resp.candidates and resp.candidates[0].content.parts else ""
+            max_tokens=64 * len(items) + 64,
         )
-        return _parse_ai_url(text)
+        answers = json.loads(resp.choices[0].message.content)
+        if not isinstance(answers, dict):
+            raise ValueError(f"expected a JSON object, got {type(answers).__name__}")
     except Exception as e:
-        print(f"  Gemini error: {e}")
-        return None
-
-
-def ask_ai_for_webpage(company_name: str, country: str, openai_key: str | None, gemini_key: str | None) -> str | None:
-    """Try OpenAI (ai_openai) first, then Gemini (ai_gemini) as fallback."""
-    if openai_key:
-        new_url = ask_openai_for_webpage(company_name, country, openai_key)
-        if new_url:
-            return new_url
-        print("  Trying Gemini fallback...")
-    if gemini_key:
-        return ask_gemini_for_webpage(company_name, country, gemini_key)
-    return None
+        print(f"  OpenAI batch error: {e}")
+        answers = {}
+    return [
+        parse_ai_url(url) if isinstance(url := answers.get(str(i)), str) else None
+        for i in range(len(items))
+    ]
+
+
+async def _ask_webpages(items: list[tuple[str, str]], openai_client, gemini_client) -> list[str | None]:
+    """Ask AI for (name, country) items; results are in input order.
+
+    OpenAI gets BATCH_SIZE companies per request (batches run concurrently); Gemini is then
+    asked per company, only for the ones OpenAI could not resolve.
+    """
+    sem = asyncio.Semaphore(CONCURRENCY)
+    results: list[str | None] = [None] * len(items)
+
+    if openai_client:
+        async def batch(chunk: list[tuple[str, str]]) -> list[str | None]:
+            async with sem:
+                return await ask_openai_batch(openai_client, chunk)
+
+        starts = range(0, len(items), BATCH_SIZE)
+        answers = await asyncio.gather(*(batch(items[i:i + BATCH_SIZE]) for i in starts), return_exceptions=True)
+        for i, urls in zip(starts, answers):
+            if not isinstance(urls, BaseException):
+                results[i:i + len(urls)] = urls
+
+    if gemini_client:
+        missing = [i for i, url in enumerate(results) if not url]
+        if missing and openai_client:
+            print(f"  Trying Gemini fallback for {len(missing)} companies...")
+
+        async def one(name: str, country: str) -> str | None:
+            async with sem:
+                return await ask_gemini_for_webpage(gemini_client, name, country)
+
+        answers = await asyncio.gather(*(one(*items[i]) for i in missing), return_exceptions=True)
+        for i, url in zip(missing, answers):
+            results[i] = None if isinstance(url, BaseException) else url
+    return results
+
+
+async def resolve_webpages(items: list[tuple[str, str]], openai_client, gemini_client,
+                           use_cache: bool = True, store: bool = True) -> list[str | None]:
+    """Like _ask_webpages, but serves and stores found URLs through the on-disk cache.
+    use_cache=False skips the lookup; fresh answers are still stored unless store=False
+    (callers that HEAD-check answers first store them with cache_webpages)."""
+    results = cached_webpages(items) if use_cache else [None] * len(items)
+    missing = [i for i, url in enumerate(results) if not url]
+    if len(missing) < len(items):
+        print(f"  {len(items) - len(missing)} webpage(s) from cache")
+    for i, url in zip(missing, await _ask_webpages([items[i] for i in missing], openai_client, gemini_client)):
+        results[i] = url
+    if store:
+        cache_webpages({items[i]: results[i] for i in missing if results[i]})
+    return results
+
+
+def cached_webpages(items: list[tuple[str, str]]) -> list[str | None]:
+    """Cached URL for each (name, country) item, None where there is none."""
+    keys = [cache_key(name, country, CACHE_VERSION) for name, country in items]
+    cached = cache_get(keys)
+    return [cached.get(key) for key in keys]
+
+
+def cache_webpages(urls: dict[tuple[str, str], str | None]) -> None:
+    """Store checked (name, country) -> URL answers; None drops a cached answer that failed its check."""
+    cache_put({cache_key(*item, CACHE_VERSION): url for item, url in urls.items() if url})
+    cache_drop([cache_key(*item, CACHE_VERSION) for item, url in urls.items() if not url])
 
 
 CSVS = ["CDC_midbln.csv", "CDC_IPO.csv", "CDC_CIS_100mln.csv"]
+# 1 MiB read/write buffers for streaming the CSVs
+CSV_BUFFER = 1 << 20
+# Prefilter the CSVs in worker processes only above this total size: serial prefiltering runs at
+# ~50 MiB/s, and starting workers costs ~10 ms (fork) to ~0.6 s (spawn) before any row is read
+PARALLEL_PREFILTER_BYTES = 64 << 20
+
+
+def _csv_columns(header: list[str]) -> dict[str, int]:
+    """Column name -> index (last one wins on duplicates, like DictReader)."""
+    return {name: i for i, name in enumerate(header)}
+
+
+def prefilter_csv(csv_path: Path) -> list[tuple[int, str, str, str]] | None:
+    """Stream a CSV and return (row index, name, country, url) for rows whose webpage is a
+    non-brand page. Returns None if the CSV has no webpage column."""
+    with open(csv_path, encoding="utf-8", newline="", buffering=CSV_BUFFER) as f:
+        # Plain csv.reader with column indexes instead of a dict per row
+        reader = csv.reader(f)
+        header = next(reader, [])
+        cols = _csv_columns(header)
+        if "webpage" not in cols:
+            return None
+        width = len(header)
+        url_i, name_i, country_i = cols["webpage"], cols.get("brand_name"), cols.get("country")
+        found = []
+        for i, row in enumerate(filter(None, reader)):
+            if len(row) < width:
+                row += [""] * (width - len(row))
+            url = row[url_i].strip()
+            if not url.startswith("http") or not is_non_brand_page(url):
+                continue
+
+            name = row[name_i].strip() if name_i is not None else ""
+            country = row[country_i].strip() if country_i is not None else ""
+            found.append((i, name or "Unknown", country, url))
+    return found
 
 
-def main():
+def rewrite_csv(csv_path: Path, patches: dict[int, str]) -> None:
+    """Stream csv_path into a temp file with webpage replaced for patched row indexes, then swap it in."""
+    fd, tmp_path = tempfile.mkstemp(dir=csv_path.parent, suffix=".tmp")
+    try:
+        with open(csv_path, encoding="utf-8", newline="", buffering=CSV_BUFFER) as src, \
+                open(fd, "w", encoding="utf-8", newline="", buffering=CSV_BUFFER) as dst:
+            reader = csv.reader(src)
+            writer = csv.writer(dst)
+            header = next(reader, [])
+            writer.writerow(header)
+            url_i, width = _csv_columns(header)["webpage"], len(header)
+            # Blank lines are skipped (and not counted) like DictReader does in prefilter_csv
+            for i, row in enumerate(filter(None, reader)):
+                if len(row) < width:
+                    row += [""] * (width - len(row))
+                if i in patches:
+                    row[url_i] = patches[i]
+                writer.writerow(row)
+        # mkstemp creates the file 0600; keep the CSV's own permissions
+        os.chmod(tmp_path, os.stat(csv_path).st_mode & 0o7777)
+        os.replace(tmp_path, csv_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+async def main():
     import argparse
     p = argparse.ArgumentParser(description="Replace IPO/non-brand webpages with main company sites via AI")
     p.add_argument("--limit", type=int, default=0, help="Max companies to fix (0=no limit)")
+    p.add_argument("--no-cache", action="store_true", help="Ignore cached AI answers (fresh ones are still stored)")
     args = p.parse_args()
     root = Path(__file__).parent
     openai_key, gemini_key = get_ai_keys()
@@ -156,72 +276,30 @@ def main():
         print("Error: No AI key found. Set config_openai.json or config_gemini.json (ai_openai / ai_gemini).")
         sys.exit(1)
 
-    try:
-        from openai import OpenAI  # noqa: F401
-    except ImportError:
-        if openai_key:
-            print("Error: Install openai: pip install openai")
-            sys.exit(1)
-
-    total_fixed = 0
-    limit_remaining = args.limit
-    for csv_name in CSVS:
-        csv_path = root / csv_name
-        if not csv_path.exists():
-            continue
-
-        with open(csv_path, encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            rows = list(reader)
-            fieldnames = reader.fieldnames
-
-        if "webpage" not in (fieldnames or []):
+    # Collect every row needing a new webpage first: (source, row index or JSON company, name, country, current url)
+    todo = []
+    csv_names = [csv_name for csv_name in CSVS if (root / csv_name).exists()]
+    csv_paths = [root / csv_name for csv_name in csv_names]
+    workers = min(len(csv_paths), os.cpu_count() or 1)
+    if workers > 1 and sum(p.stat().st_size for p in csv_paths) >= PARALLEL_PREFILTER_BYTES:
+        # Files are independent; prefilter large ones in parallel (one worker per file)
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            prefiltered = list(ex.map(prefilter_csv, csv_paths))
+    else:
+        prefiltered = [prefilter_csv(p) for p in csv_paths]
+    for csv_name, rows_to_fix in zip(csv_names, prefiltered):
+        if rows_to_fix is None:
             print(f"  {csv_name}: no webpage column, skip")
             continue
-
-        fixed = 0
-        for row in rows:
-            url = (row.get("webpage") or "").strip()
-            if not url or not url.startswith("http"):
-                continue
-
-            if not is_non_brand_page(url):
-                continue
-
-            name = row.get("brand_name", "").strip() or "Unknown"
-            country = row.get("country", "").strip() or ""
-            print(f"\n[csv={csv_name}] IPO page: {name}")
-            print(f"  URL: {url}")
-            print("  Asking AI for main company webpage...")
-            new_url = ask_ai_for_webpage(name, country, openai_key, gemini_key)
-            if new_url:
-                print(f"  -> Replaced with: {new_url}")
-                row["webpage"] = new_url
-                fixed += 1
-                total_fixed += 1
-                if args.limit and (limit_remaining := limit_remaining - 1) <= 0:
-                    break
-            else:
-                print("  -> No alternative found, keeping original")
-        if limit_remaining <= 0 and args.limit:
-            break
-
-        if fixed > 0:
-            with open(csv_path, "w", encoding="utf-8", newline="") as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(rows)
-            print(f"  Saved {csv_name}: {fixed} updated")
+        todo.extend((csv_name, *item) for item in rows_to_fix)
 
     # Also process companies-by-revenue.json (treemap source)
     # Fix: null webpage (would show Yahoo Finance) or non-brand URLs
     json_path = root / "companies-by-revenue.json"
-    if json_path.exists() and not (args.limit and limit_remaining <= 0):
-        with open(json_path, encoding="utf-8") as f:
-            data = json.load(f)
-        companies = data.get("companies", [])
-        json_fixed = 0
-        for c in companies:
+    data = None
+    if json_path.exists():
+        data = load_json(json_path)
+        for c in data.get("companies", []):
             url = c.get("webpage")
             url_str = (url or "").strip() if isinstance(url, str) else ""
             name = c.get("name", "").strip() or "Unknown"
@@ -232,28 +310,55 @@ def main():
                 (not url_str and has_ipo)  # null webpage -> treemap shows Yahoo Finance
                 or (url_str and is_non_brand_page(url_str))
             )
-            if not needs_fix:
-                continue
-            print(f"\n[json] {name}")
-            print(f"  Current: {url_str or '(null - treemap shows Yahoo Finance)'}")
-            print("  Asking AI for main company webpage...")
-            new_url = ask_ai_for_webpage(name, country, openai_key, gemini_key)
+            if needs_fix:
+                todo.append(("json", c, name, country, url_str))
+
+    # SDK clients are only built (and openai / google.genai imported) when some row needs AI
+    if todo:
+        openai_client, gemini_client = make_ai_clients(openai_key, gemini_key)
+
+    # Resolve concurrently; with --limit, dispatch only as many lookups as fixes still allowed
+    csv_patches: dict[str, dict[int, str]] = {}
+    fixed_by_source: dict[str, int] = {}
+    total_fixed = 0
+    pending = todo
+    while pending:
+        if args.limit:
+            batch, pending = pending[: args.limit - total_fixed], pending[args.limit - total_fixed:]
+        else:
+            batch, pending = pending, []
+        print(f"\nAsking AI for main company webpage ({len(batch)} companies)...")
+        new_urls = await resolve_webpages([(name, country) for _, _, name, country, _ in batch], openai_client, gemini_client, use_cache=not args.no_cache)
+        for (source, target, name, country, url), new_url in zip(batch, new_urls):
+            if source == "json":
+                print(f"\n[json] {name}")
+                print(f"  Current: {url or '(null - treemap shows Yahoo Finance)'}")
+            else:
+                print(f"\n[csv={source}] IPO page: {name}")
+                print(f"  URL: {url}")
             if new_url:
-                print(f"  -> Set: {new_url}")
-                c["webpage"] = new_url
-                json_fixed += 1
+                print(f"  -> {'Set' if source == 'json' else 'Replaced with'}: {new_url}")
+                if source == "json":
+                    target["webpage"] = new_url
+                else:
+                    csv_patches.setdefault(source, {})[target] = new_url
+                fixed_by_source[source] = fixed_by_source.get(source, 0) + 1
                 total_fixed += 1
-                if args.limit and (limit_remaining := limit_remaining - 1) <= 0:
-                    break
             else:
-                print("  -> No alternative found")
-        if json_fixed > 0:
-            with open(json_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2)
-            print(f"  Saved companies-by-revenue.json: {json_fixed} updated")
+                print("  -> No alternative found" + ("" if source == "json" else ", keeping original"))
+        if args.limit and total_fixed >= args.limit:
+            break
 
-    print(f"\nDone: {total_fixed} webpage(s) replaced across CSVs + JSON.")
+    for csv_name, patches in csv_patches.items():
+        rewrite_csv(root / csv_name, patches)
+        print(f"  Saved {csv_name}: {len(patches)} updated")
 
+    json_fixed = fixed_by_source.get("json", 0)
+    if json_fixed > 0:
+        dump_json(json_path, data)
+        print(f"  Saved companies-by-revenue.json: {json_fixed} updated")
+
+    print(f"\nDone: {total_fixed} webpage(s) replaced across CSVs + JSON.")
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -1,36 +1,70 @@
 """Merge webpage URLs from CSVs into companies-by-revenue.json."""
 import csv
-import json
+import re
 from pathlib import Path
 
+from webpage_common import dump_json, load_json
+
 ROOT = Path(__file__).parent
 CSVS = ["CDC_midbln.csv", "CDC_IPO.csv", "CDC_CIS_100mln.csv"]
 JSON_PATH = ROOT / "companies-by-revenue.json"
+_WS_RE = re.compile(r"\s+")
 
 
-def main():
+def normalize_name(name: str) -> str:
+    """Case- and whitespace-insensitive key for company names."""
+    return _WS_RE.sub(" ", name.strip()).casefold()
+
+
+def load_csv_webpages() -> tuple[dict[str, str], dict[str, str]]:
+    """Return (brand_name -> webpage URL, normalize_name(brand_name) -> webpage URL) from the
+    CDC CSVs (later CSVs win)."""
     webpage_by_name = {}
+    webpage_by_norm = {}
     for name in CSVS:
         p = ROOT / name
         if not p.exists():
             continue
-        with open(p, encoding="utf-8") as f:
-            r = csv.DictReader(f)
+        # Plain csv.reader with column indexes: only two columns are needed, so skip per-row dicts
+        with open(p, encoding="utf-8", newline="", buffering=1 << 20) as f:
+            r = csv.reader(f)
+            # Last column wins on duplicate names, like DictReader (add_webpages appends a webpage column)
+            cols = {n: i for i, n in enumerate(next(r, []))}
+            if "brand_name" not in cols or "webpage" not in cols:
+                continue
+            bi, wi = cols["brand_name"], cols["webpage"]
             for row in r:
-                brand = row.get("brand_name", "").strip()
-                url = row.get("webpage", "").strip()
-                if brand and url and url.startswith("http"):
+                if len(row) <= max(bi, wi):
+                    continue
+                brand, url = row[bi].strip(), row[wi].strip()
+                if brand and url.startswith("http"):
                     webpage_by_name[brand] = url
+                    webpage_by_norm[normalize_name(brand)] = url
+    return webpage_by_name, webpage_by_norm
+
+
+def csv_webpage(name: str, webpage_by_name: dict[str, str], webpage_by_norm: dict[str, str]) -> str | None:
+    """Exact brand_name match first, then the normalized name."""
+    return webpage_by_name.get(name) or webpage_by_norm.get(normalize_name(name))
+
+
+def main():
+    webpage_by_name, webpage_by_norm = load_csv_webpages()
 
-    with open(JSON_PATH, encoding="utf-8") as f:
-        data = json.load(f)
+    data = load_json(JSON_PATH)
 
-    for c in data["companies"]:
+    # Company index -> merged webpage, only where it differs; unchanged files are not rewritten
+    patches = {}
+    for i, c in enumerate(data["companies"]):
         name = c.get("name", "")
-        c["webpage"] = webpage_by_name.get(name) or c.get("webpage") or None
+        webpage = csv_webpage(name, webpage_by_name, webpage_by_norm) or c.get("webpage") or None
+        if "webpage" not in c or webpage != c["webpage"]:
+            patches[i] = webpage
 
-    with open(JSON_PATH, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
+    if patches:
+        for i, webpage in patches.items():
+            data["companies"][i]["webpage"] = webpage
+        dump_json(JSON_PATH, data)
 
     merged = sum(1 for c in data["companies"] if c.get("webpage"))
     print(f"Updated {JSON_PATH}: {merged}/{len(data['companies'])} companies have webpage")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Single-pass webpage pipeline for companies-by-revenue.json.
+Does the work of merge_webpages.py, fix_ipo_webpages.py and verify_webpages.py in one traversal:
+merge CSV webpages, flag missing/non-brand pages, HEAD-check the rest, ask AI for everything
+flagged, HEAD-check the suggestions, then write the JSON once.
+"""
+
+import asyncio
+import sys
+
+import httpx
+
+from fix_ipo_webpages import cache_webpages, cached_webpages, is_non_brand_page, resolve_webpages
+from merge_webpages import JSON_PATH, csv_webpage, load_csv_webpages
+from verify_webpages import BAD_CODES, HTTP_OPTIONS, check_urls
+from webpage_common import dump_json, get_ai_keys, load_json, make_ai_clients
+
+
+async def main():
+    import argparse
+    p = argparse.ArgumentParser(description="Merge, fix and verify companies-by-revenue.json webpages in one pass")
+    p.add_argument("--no-cache", action="store_true", help="Ignore cached AI answers (fresh ones are still stored)")
+    args = p.parse_args()
+    openai_key, gemini_key = get_ai_keys()
+
+    if not openai_key and not gemini_key:
+        print("Error: No AI key found. Set config_openai.json or config_gemini.json (ai_openai / ai_gemini).")
+        sys.exit(1)
+
+    webpage_by_name, webpage_by_norm = load_csv_webpages()
+    data = load_json(JSON_PATH)
+    companies = data.get("companies", [])
+
+    # Merge CSV webpages, then split into companies that need AI and URLs to HEAD-check.
+    # Changes are collected as company index -> webpage patches; the JSON is only rewritten if there are any.
+    patches: dict[int, str | None] = {}
+    needs_ai = []
+    to_check = []
+    for i, c in enumerate(companies):
+        webpage = csv_webpage(c.get("name", ""), webpage_by_name, webpage_by_norm) or c.get("webpage") or None
+        if "webpage" not in c or webpage != c["webpage"]:
+            patches[i] = webpage
+        url = webpage.strip() if isinstance(webpage, str) else ""
+        if (not url and c.get("ipo")) or (url and is_non_brand_page(url)):
+            # null webpage -> treemap shows Yahoo Finance; or IPO/investor page
+            needs_ai.append((i, c, webpage))
+        elif url.startswith("http"):
+            to_check.append((i, c, webpage, url))
+
+    async with httpx.AsyncClient(**HTTP_OPTIONS) as http:
+        statuses = await check_urls(http, [url for *_, url in to_check])
+        for (i, c, webpage, url), status in zip(to_check, statuses):
+            if status in BAD_CODES:
+                print(f"[{status}] {c.get('name', 'Unknown')}: {url}")
+                needs_ai.append((i, c, webpage))
+
+        # SDK clients are only built (and openai / google.genai imported) when some company needs AI
+        openai_client = gemini_client = None
+        if needs_ai:
+            print(f"Asking AI for main company webpage ({len(needs_ai)} companies)...")
+            openai_client, gemini_client = make_ai_clients(openai_key, gemini_key)
+        items = [(c.get("name", "").strip() or "Unknown", c.get("country", "").strip()) for _, c, _ in needs_ai]
+        # Cached answers are HEAD-checked first; the ones that fail are asked again along with the misses
+        new_urls = cached_webpages(items) if not args.no_cache else [None] * len(items)
+        new_statuses: list[int | None] = [None] * len(items)
+        hits = [j for j, new_url in enumerate(new_urls) if new_url]
+        for j, status in zip(hits, await check_urls(http, [new_urls[j] for j in hits])):
+            new_statuses[j] = status
+        stale = {j for j in hits if new_statuses[j] in BAD_CODES or not 200 <= new_statuses[j] < 400}
+        if hits:
+            print(f"  {len(hits) - len(stale)} webpage(s) from cache, {len(stale)} stale")
+        ask = [j for j, new_url in enumerate(new_urls) if not new_url or j in stale]
+        # Fresh answers are only cached once they pass their own HEAD check
+        fresh = await resolve_webpages([items[j] for j in ask], openai_client, gemini_client, use_cache=False, store=False)
+        for j, new_url in zip(ask, fresh):
+            new_urls[j], new_statuses[j] = new_url, None
+        ask = [j for j in ask if new_urls[j]]
+        for j, status in zip(ask, await check_urls(http, [new_urls[j] for j in ask])):
+            new_statuses[j] = status
+
+    fixed = 0
+    # (name, country) -> URL to cache, None to drop a cached answer that failed
+    checked = {items[j]: None for j in stale}
+    for (i, c, webpage), item, new_url, status in zip(needs_ai, items, new_urls, new_statuses):
+        if not new_url:
+            continue
+        name = c.get("name", "Unknown")
+        if status not in BAD_CODES and 200 <= status < 400:
+            print(f"{name}: {webpage or '(null)'} -> {new_url} (status {status})")
+            patches[i] = new_url
+            checked[item] = new_url
+            fixed += 1
+        else:
+            print(f"{name}: suggested {new_url} returned {status}, kept old")
+            checked[item] = None
+    cache_webpages(checked)
+
+    if patches:
+        for i, webpage in patches.items():
+            companies[i]["webpage"] = webpage
+        dump_json(JSON_PATH, data)
+
+    merged = sum(1 for c in companies if c.get("webpage"))
+    print(f"\nDone: {fixed} fixed, {len(needs_ai) - fixed} unresolved; {merged}/{len(companies)} companies have webpage")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
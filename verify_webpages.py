@@ -4,129 +4,236 @@ Check every webpage in companies-by-revenue.json.
 If HTTP status is 404 or 423, use AI (ai_openai / OpenAI first, Gemini fallback) to find another relevant official webpage.
 """
 
+import asyncio
+import importlib.util
 import json
-import re
+import socket
 import sys
 from pathlib import Path
+from urllib.parse import urlsplit
+from urllib.request import getproxies
 
-def _load_openai_key(config_dir: Path) -> str | None:
-    p = config_dir / "config_openai.json"
-    if not p.exists():
-        return None
-    with open(p, encoding="utf-8") as f:
-        return json.load(f).get("openai_api_key")
+import httpx
 
+from webpage_common import (
+    CONCURRENCY, HTTP_PREFIX, cache_drop, cache_get, cache_key, cache_put, dump_json, gemini_generate,
+    get_ai_keys, load_json, make_ai_clients, openai_chat, parse_ai_url,
+)
 
-def _load_gemini_key(config_dir: Path) -> str | None:
-    p = config_dir / "config_gemini.json"
-    if not p.exists():
-        return None
-    with open(p, encoding="utf-8") as f:
-        return json.load(f).get("ITEM")
-
-
-def get_ai_keys() -> tuple[str | None, str | None]:
-    """Return (openai_key, gemini_key). Tries configix ai_openai/ai_gemini, then config dirs."""
-    openai_key = gemini_key = None
-    for base in [
-        Path(__file__).parent.parent / "config",
-        Path("C:/12_CODINGHARD/config"),
-        Path(__file__).parent / "config",
-    ]:
-        if base.exists():
-            openai_key = openai_key or _load_openai_key(base)
-            gemini_key = gemini_key or _load_gemini_key(base)
-    try:
-        cfg = __import__("configix").apiManager
-        openai_key = openai_key or cfg.get_ai_provider("ai_openai")["api_key"]
-        gemini_key = gemini_key or cfg.get_ai_provider("ai_gemini")["api_key"]
-    except Exception:
-        pass
-    return openai_key, gemini_key
+# Max HEAD checks in flight at once (AI lookups use webpage_common.CONCURRENCY)
+HTTP_CONCURRENCY = 50
+
+# HTTP statuses that mark a webpage as broken
+BAD_CODES = {404, 423}
+
+# Connection-pooled HTTP settings for the AsyncClient HEAD checks; HTTP/2 when h2 is installed
+HTTP_OPTIONS = dict(
+    http2=importlib.util.find_spec("h2") is not None,
+    timeout=10,
+    headers={"User-Agent": "Mozilla/5.0 (compatible; WebpageChecker/1.0)"},
+    limits=httpx.Limits(max_connections=HTTP_CONCURRENCY, max_keepalive_connections=HTTP_CONCURRENCY),
+)
+
+# DNS pre-check before any HEAD: hosts that don't resolve fail in at most PROBE_TIMEOUT seconds
+# instead of the full HTTP timeout. Results are cached per host for the run. Skipped when an
+# HTTP(S) proxy is configured: httpx then connects through the proxy, which resolves hosts itself.
+PROBE_TIMEOUT = 2
+PROBE_DNS = not getproxies()
+_PROBE_CACHE: dict[str, bool] = {}
 
+# Prompt version for the AI answer cache keys (see webpage_common.cache_key)
+CACHE_VERSION = "verify-v1"
 
-def check_url(url: str, timeout: int = 10) -> int:
-    """Return HTTP status code. Uses HEAD first, falls back to GET."""
+
+def _host_port(url: str) -> tuple[str, int] | None:
     try:
-        import urllib.request
+        parts = urlsplit(url)
+        if not parts.hostname:
+            return None
+        return parts.hostname, parts.port or (443 if parts.scheme == "https" else 80)
+    except ValueError:
+        return None
 
-        req = urllib.request.Request(url, method="HEAD", headers={"User-Agent": "Mozilla/5.0 (compatible; WebpageChecker/1.0)"})
-        with urllib.request.urlopen(req, timeout=timeout) as r:
-            return r.status
-    except urllib.error.HTTPError as e:
-        return e.code
+
+async def _probe_async(host: str, port: int) -> bool:
+    """False only if host definitely doesn't resolve; DNS timeouts fall through to the HEAD. Cached per host."""
+    if host not in _PROBE_CACHE:
+        try:
+            await asyncio.wait_for(asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM),
+                                   PROBE_TIMEOUT)
+            _PROBE_CACHE[host] = True
+        except (socket.gaierror, UnicodeError):
+            _PROBE_CACHE[host] = False
+        except (OSError, asyncio.TimeoutError):
+            _PROBE_CACHE[host] = True
+    return _PROBE_CACHE[host]
+
+
+async def check_url_async(client: httpx.AsyncClient, url: str, timeout: int = 10) -> int:
+    """Return HTTP status code of a HEAD request on a shared AsyncClient (-1 on network error).
+    Hosts that don't resolve return -1 without an HTTP request."""
+    target = _host_port(url)
+    if target is None or (PROBE_DNS and not await _probe_async(*target)):
+        return -1
+    try:
+        return (await client.head(url, follow_redirects=True, timeout=timeout)).status_code
     except Exception:
         return -1
 
 
-def _parse_ai_url(text: str) -> str | None:
-    """Extract a valid https URL from AI response."""
-    text = (text or "").strip()
-    text = re.sub(r"^['\"]|['\"]$", "", text)
-    if text.upper() == "NONE" or not text.startswith("http"):
-        return None
-    return text
+async def check_urls(client: httpx.AsyncClient, urls: list[str]) -> list[int]:
+    """HEAD-check urls concurrently (at most HTTP_CONCURRENCY in flight); statuses in input order."""
+    sem = asyncio.Semaphore(HTTP_CONCURRENCY)
+
+    async def one(url: str) -> int:
+        async with sem:
+            return await check_url_async(client, url)
 
+    return await asyncio.gather(*(one(url) for url in urls))
 
-def ask_openai_for_webpage(company_name: str, country: str, api_key: str) -> str | None:
+
+# Structured output for single-company OpenAI lookups: {"url": "https://..."} or {"url": null}
+_URL_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "webpage",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {"url": {"type": ["string", "null"]}},
+            "required": ["url"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+
+def _json_url(content: str) -> str | None:
+    """The "url" of a _URL_RESPONSE_FORMAT reply if it is an http(s) URL."""
+    url = json.loads(content)["url"]
+    return url if isinstance(url, str) and url.startswith(HTTP_PREFIX) else None
+
+
+async def ask_openai_for_webpage(client, company_name: str, country: str) -> str | None:
     """Use OpenAI (ai_openai) to suggest an official company website."""
     try:
-        from openai import OpenAI
-
-        client = OpenAI(api_key=api_key)
-        resp = client.chat.completions.create(
+        resp = await openai_chat(
+            client,
             model="gpt-4o-mini",
             messages=[
                 {
                     "role": "system",
-                    "content": "You are a researcher. Reply with ONLY a single valid URL (starting with https://) of the official corporate website for the given company. If unsure, return a best guess. No explanation, no quotes, just the URL. If you cannot find a reliable URL, reply with exactly: NONE",
+                    "content": "You are a researcher. Give the URL (starting with https://) of the official corporate website for the given company. If unsure, return a best guess. If you cannot find a reliable URL, return null.",
                 },
                 {
                     "role": "user",
                     "content": f"Official website URL for: {company_name} (company based in {country}). Construction/real estate/development company.",
                 },
             ],
+            response_format=_URL_RESPONSE_FORMAT,
             temperature=0.3,
             max_tokens=256,
         )
-        return _parse_ai_url(resp.choices[0].message.content)
+        return _json_url(resp.choices[0].message.content)
     except Exception as e:
-        print(f"  OpenAI error: {e}")
+        print(f"  OpenAI error ({company_name}): {e}")
         return None
 
 
-def ask_gemini_for_webpage(company_name: str, country: str, api_key: str) -> str | None:
+async def ask_gemini_for_webpage(client, company_name: str, country: str) -> str | None:
     """Use Gemini (fallback when OpenAI quota exceeded) to suggest an official company website."""
     try:
-        from google import genai
-
-        client = genai.Client(api_key=api_key)
-        resp = client.models.generate_content(
+        resp = await gemini_generate(
+            client,
             model="gemini-2.0-flash",
             contents=f"Official website URL for: {company_name} (company based in {country}). Construction/real estate/development company. Reply with ONLY a single valid https URL. No explanation. If unknown, reply NONE.",
         )
         text = getattr(resp, "text", None) or (
             resp.candidates[0].content.parts[0].text if resp.candidates and resp.candidates[0].content.parts else ""
         )
-        return _parse_ai_url(text)
+        return parse_ai_url(text)
     except Exception as e:
-        print(f"  Gemini error: {e}")
+        print(f"  Gemini error ({company_name}): {e}")
         return None
 
 
-def ask_ai_for_webpage(company_name: str, country: str, openai_key: str | None, gemini_key: str | None) -> str | None:
+async def ask_ai_for_webpage(company_name: str, country: str, openai_client, gemini_client) -> str | None:
     """Try OpenAI (ai_openai) first, then Gemini as fallback."""
-    if openai_key:
-        new_url = ask_openai_for_webpage(company_name, country, openai_key)
+    if openai_client:
+        new_url = await ask_openai_for_webpage(openai_client, company_name, country)
         if new_url:
             return new_url
-        print(f"  Trying Gemini fallback...")
-    if gemini_key:
-        return ask_gemini_for_webpage(company_name, country, gemini_key)
+        print(f"  {company_name}: trying Gemini fallback...")
+    if gemini_client:
+        return await ask_gemini_for_webpage(gemini_client, company_name, country)
     return None
 
 
-def main():
+async def resolve_and_check(http: httpx.AsyncClient, items: list[tuple[str, str]], openai_client, gemini_client,
+                            use_cache: bool = True) -> list[tuple[str | None, int | None]]:
+    """Ask AI for (name, country) items and HEAD-check each suggestion as soon as it arrives: AI workers
+    feed HEAD workers through a queue, so checks overlap the remaining AI calls. Returns (new_url, status)
+    in input order; (None, None) where nothing was found. Answers go through the on-disk cache
+    (use_cache=False skips the lookup): only URLs that pass the HEAD check are stored. Cached
+    ones are re-checked first; those that fail are dropped and asked again like cache misses."""
+    keys = [cache_key(name, country, CACHE_VERSION) for name, country in items]
+    cached = cache_get(keys) if use_cache else {}
+    results: list[tuple[str | None, int | None]] = [(None, None)] * len(items)
+    found = {}
+    stale = []
+    if cached:
+        hits = [(i, cached[key]) for i, key in enumerate(keys) if key in cached]
+        for (i, url), status in zip(hits, await check_urls(http, [url for _, url in hits])):
+            if status not in BAD_CODES and 200 <= status < 400:
+                results[i] = (url, status)
+            else:
+                stale.append(keys[i])
+                del cached[keys[i]]
+        print(f"  {len(cached)} webpage(s) from cache, {len(stale)} stale")
+    todo: asyncio.Queue[int] = asyncio.Queue()
+    suggestions: asyncio.Queue[tuple[int, str]] = asyncio.Queue()
+    for i, key in enumerate(keys):
+        if key not in cached:
+            todo.put_nowait(i)
+
+    async def ai_worker():
+        while not todo.empty():
+            i = todo.get_nowait()
+            try:
+                url = await ask_ai_for_webpage(*items[i], openai_client, gemini_client)
+            except Exception:
+                url = None
+            if url:
+                suggestions.put_nowait((i, url))
+
+    async def head_worker():
+        while True:
+            i, url = await suggestions.get()
+            try:
+                status = await check_url_async(http, url)
+                results[i] = (url, status)
+                if status not in BAD_CODES and 200 <= status < 400:
+                    found[keys[i]] = url
+            finally:
+                suggestions.task_done()
+
+    heads = [asyncio.create_task(head_worker()) for _ in range(HTTP_CONCURRENCY)]
+    try:
+        await asyncio.gather(*(ai_worker() for _ in range(CONCURRENCY)))
+        await suggestions.join()
+    finally:
+        for t in heads:
+            t.cancel()
+    cache_put(found)
+    cache_drop(stale)
+    return results
+
+
+async def main():
+    import argparse
+    p = argparse.ArgumentParser(description="Check companies-by-revenue.json webpages; replace 404/423 pages via AI")
+    p.add_argument("--no-cache", action="store_true", help="Ignore cached AI answers (fresh ones are still stored)")
+    args = p.parse_args()
     root = Path(__file__).parent
     json_path = root / "companies-by-revenue.json"
     openai_key, gemini_key = get_ai_keys()
@@ -135,21 +242,14 @@ def main():
         print("Error: No AI key found. Set config_openai.json or config_gemini.json (ai_openai / ai_gemini).")
         sys.exit(1)
 
-    try:
-        from openai import OpenAI  # noqa: F401
-    except ImportError:
-        if openai_key:
-            print("Error: Install openai: pip install openai")
-            sys.exit(1)
-
-    with open(json_path, encoding="utf-8") as f:
-        data = json.load(f)
+    data = load_json(json_path)
 
     companies = data.get("companies", [])
-    BAD_CODES = {404, 423}
     fixed = 0
     failed = []
 
+    # Check every URL concurrently first, then ask AI for all broken ones while checking its answers
+    to_check = []
     for i, c in enumerate(companies):
         url = c.get("webpage") if isinstance(c.get("webpage"), str) else None
         if not url or not url.startswith("http"):
@@ -157,30 +257,45 @@ def main():
 
         name = c.get("name", "Unknown")
         country = c.get("country", "")
-
-        status = check_url(url)
-        if status in BAD_CODES:
-            print(f"[{status}] {name}: {url}")
-            print(f"  Asking AI for alternative...")
-            new_url = ask_ai_for_webpage(name, country, openai_key, gemini_key)
-            if new_url:
-                new_status = check_url(new_url)
-                if new_status not in BAD_CODES and new_status >= 200 and new_status < 400:
-                    print(f"  -> Replaced with: {new_url} (status {new_status})")
-                    c["webpage"] = new_url
-                    fixed += 1
-                else:
-                    print(f"  -> Suggested URL returned {new_status}, kept old")
-                    failed.append((name, url, new_url))
+        to_check.append((i, name, country, url))
+
+    async with httpx.AsyncClient(**HTTP_OPTIONS) as http:
+        statuses = await check_urls(http, [url for *_, url in to_check])
+        broken = []
+        for (i, name, country, url), status in zip(to_check, statuses):
+            if status in BAD_CODES:
+                print(f"[{status}] {name}: {url}")
+                broken.append((i, name, country, url))
+
+        # SDK clients are only built (and openai / google.genai imported) when some URL is broken
+        openai_client = gemini_client = None
+        if broken:
+            print(f"Asking AI for alternatives ({len(broken)} companies)...")
+            openai_client, gemini_client = make_ai_clients(openai_key, gemini_key)
+        results = await resolve_and_check(http, [(name, country) for _, name, country, _ in broken], openai_client, gemini_client, use_cache=not args.no_cache)
+
+    # Company index -> accepted URL; the JSON is only rewritten when there is something to patch
+    patches: dict[int, str] = {}
+    for (i, name, country, url), (new_url, new_status) in zip(broken, results):
+        print(f"{name}: {url}")
+        if new_url:
+            if new_status not in BAD_CODES and new_status >= 200 and new_status < 400:
+                print(f"  -> Replaced with: {new_url} (status {new_status})")
+                patches[i] = new_url
+                fixed += 1
             else:
-                print(f"  -> No alternative found")
-                failed.append((name, url, None))
+                print(f"  -> Suggested URL returned {new_status}, kept old")
+                failed.append((name, url, new_url))
+        else:
+            print(f"  -> No alternative found")
+            failed.append((name, url, None))
 
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
+    if patches:
+        for i, new_url in patches.items():
+            companies[i]["webpage"] = new_url
+        dump_json(json_path, data)
 
     print(f"\nDone: {fixed} fixed, {len(failed)} still broken.")
 
-
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -0,0 +1,227 @@
+"""
+Helpers shared by fix_ipo_webpages.py, verify_webpages.py, merge_webpages.py and pipeline.py:
+companies-by-revenue.json I/O, AI keys and clients, rate-limited/retried AI calls, and the
+on-disk cache of AI webpage answers.
+"""
+
+import hashlib
+import json
+import sqlite3
+import sys
+from contextlib import closing
+from functools import lru_cache
+from pathlib import Path
+
+# orjson reads/writes the treemap JSON several times faster; stdlib json is the fallback
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def load_json(path: Path):
+    """orjson.loads, falling back to json.load for what orjson rejects (NaN/Infinity literals)."""
+    if orjson:
+        try:
+            return orjson.loads(path.read_bytes())
+        except orjson.JSONDecodeError:
+            pass
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def dump_json(path: Path, data) -> None:
+    """Write data as 2-space indented UTF-8 JSON with a trailing newline.
+
+    Not byte-identical across backends: orjson spells some floats differently (1e16, 2e-7 vs
+    json's 1e+16, 2e-07), and writes NaN/Infinity as null where json writes the literals.
+    Both write non-ASCII raw rather than as \\uXXXX escapes.
+    """
+    if orjson:
+        path.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE))
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+
+# Max AI requests in flight at once
+CONCURRENCY = 10
+
+# Proactive throttling at the OpenAI gpt-4o-mini tier-1 limits (500 RPM / 200k TPM), so
+# concurrent requests queue locally instead of burning time in 429 backoff
+OPENAI_RPM = 500
+OPENAI_TPM = 200_000
+
+
+# Connection/timeout exception classes (matched by name on any base, so the SDKs stay lazily imported):
+# openai APIConnectionError/APITimeoutError, httpx TransportError, builtin ConnectionError/TimeoutError
+_TRANSIENT_ERRORS = {"APIConnectionError", "APITimeoutError", "TransportError", "ConnectionError", "TimeoutError"}
+
+
+def _is_transient(e: BaseException) -> bool:
+    """429 / 5xx responses and connection or timeout failures; 400, 401, 404 etc. are permanent."""
+    # openai errors carry status_code, google-genai APIError carries code
+    status = getattr(e, "status_code", None) or getattr(e, "code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    return any(cls.__name__ in _TRANSIENT_ERRORS for cls in type(e).__mro__)
+
+
+# aiolimiter and tenacity are imported on the first AI call only, so JSON-only users
+# (merge_webpages) load with the stdlib alone
+@lru_cache(maxsize=1)
+def _openai_limiters():
+    """Process-wide (RPM, TPM) AsyncLimiter pair."""
+    from aiolimiter import AsyncLimiter
+    return AsyncLimiter(OPENAI_RPM, 60), AsyncLimiter(OPENAI_TPM, 60)
+
+
+@lru_cache(maxsize=None)
+def _retry_transient(fn):
+    """fn wrapped to retry transient failures with jittered backoff."""
+    from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+    return retry(retry=retry_if_exception(_is_transient), wait=wait_exponential_jitter(initial=1, max=30),
+                 stop=stop_after_attempt(5), reraise=True)(fn)
+
+
+async def _openai_chat_once(client, **kwargs):
+    # Rough token estimate: ~4 characters per prompt token, plus the completion budget
+    tokens = sum(len(m["content"]) for m in kwargs["messages"]) // 4 + kwargs.get("max_tokens", 0)
+    rpm, tpm = _openai_limiters()
+    async with rpm:
+        await tpm.acquire(min(tokens, tpm.max_rate))
+        return await client.chat.completions.create(**kwargs)
+
+
+async def _gemini_generate_once(client, **kwargs):
+    return await client.aio.models.generate_content(**kwargs)
+
+
+async def openai_chat(client, **kwargs):
+    """client.chat.completions.create under the RPM/TPM limiters; transient failures are retried with jittered backoff."""
+    return await _retry_transient(_openai_chat_once)(client, **kwargs)
+
+
+async def gemini_generate(client, **kwargs):
+    """client.aio.models.generate_content; transient failures are retried with jittered backoff."""
+    return await _retry_transient(_gemini_generate_once)(client, **kwargs)
+
+
+# Found URLs are cached on disk by (name, country, prompt version), so re-runs skip the AI
+CACHE_PATH = Path(__file__).parent / ".ai_webpage_cache.sqlite"
+
+
+def cache_key(name: str, country: str, version: str) -> str:
+    return hashlib.sha1(f"{name.lower()}|{country.lower()}|{version}".encode("utf-8")).hexdigest()
+
+
+def _cache_db() -> sqlite3.Connection:
+    db = sqlite3.connect(CACHE_PATH, timeout=30)
+    db.execute("CREATE TABLE IF NOT EXISTS webpages (key TEXT PRIMARY KEY, url TEXT NOT NULL)")
+    return db
+
+
+def cache_get(keys: list[str]) -> dict[str, str]:
+    found = {}
+    with closing(_cache_db()) as db:
+        for key in keys:
+            row = db.execute("SELECT url FROM webpages WHERE key = ?", (key,)).fetchone()
+            if row:
+                found[key] = row[0]
+    return found
+
+
+def cache_put(urls: dict[str, str]) -> None:
+    if not urls:
+        return
+    with closing(_cache_db()) as db, db:
+        db.executemany("INSERT OR REPLACE INTO webpages (key, url) VALUES (?, ?)", urls.items())
+
+
+def cache_drop(keys: list[str]) -> None:
+    if not keys:
+        return
+    with closing(_cache_db()) as db, db:
+        db.executemany("DELETE FROM webpages WHERE key = ?", ((key,) for key in keys))
+
+
+def _load_openai_key(config_dir: Path) -> str | None:
+    p = config_dir / "config_openai.json"
+    if not p.exists():
+        return None
+    with open(p, encoding="utf-8") as f:
+        return json.load(f).get("openai_api_key")
+
+
+def _load_gemini_key(config_dir: Path) -> str | None:
+    p = config_dir / "config_gemini.json"
+    if not p.exists():
+        return None
+    with open(p, encoding="utf-8") as f:
+        return json.load(f).get("ITEM")
+
+
+@lru_cache(maxsize=1)
+def get_ai_keys() -> tuple[str | None, str | None]:
+    """Return (openai_key, gemini_key). Tries config dirs, then configix ai_openai/ai_gemini."""
+    openai_key = gemini_key = None
+    for base in [
+        Path(__file__).parent.parent / "config",
+        Path("C:/12_CODINGHARD/config"),
+        Path(__file__).parent / "config",
+    ]:
+        if openai_key and gemini_key:
+            return openai_key, gemini_key
+        if base.exists():
+            openai_key = openai_key or _load_openai_key(base)
+            gemini_key = gemini_key or _load_gemini_key(base)
+    if openai_key and gemini_key:
+        return openai_key, gemini_key
+    try:
+        cfg = __import__("configix").apiManager
+        openai_key = openai_key or cfg.get_ai_provider("ai_openai")["api_key"]
+        gemini_key = gemini_key or cfg.get_ai_provider("ai_gemini")["api_key"]
+    except Exception:
+        pass
+    return openai_key, gemini_key
+
+
+HTTP_PREFIX = ("http://", "https://")
+
+
+def parse_ai_url(text: str) -> str | None:
+    """Extract a valid https URL from AI response."""
+    text = (text or "").strip().strip("'\"")
+    if text.upper() == "NONE" or not text.startswith(HTTP_PREFIX):
+        return None
+    return text
+
+
+@lru_cache(maxsize=1)
+def _openai_client(key: str):
+    """AsyncOpenAI client; the openai SDK is imported on first use only."""
+    try:
+        from openai import AsyncOpenAI
+    except ImportError:
+        print("Error: Install openai: pip install openai")
+        sys.exit(1)
+    # SDK retries off: _retry_transient is the only retry layer (and each attempt goes through the limiters)
+    return AsyncOpenAI(api_key=key, max_retries=0)
+
+
+@lru_cache(maxsize=1)
+def _gemini_client(key: str):
+    """google-genai client (None if not installed); the SDK is imported on first use only."""
+    try:
+        from google import genai
+    except ImportError:
+        print("Warning: google-genai not installed, no Gemini fallback (pip install google-genai)")
+        return None
+    return genai.Client(api_key=key)
+
+
+def make_ai_clients(openai_key: str | None, gemini_key: str | None):
+    """Build async (openai_client, gemini_client); None where no key or SDK is available."""
+    return (_openai_client(openai_key) if openai_key else None,
+            _gemini_client(gemini_key) if gemini_key else None)